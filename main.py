@@ -1,8 +1,11 @@
 import warnings
-from src.ui.chat_interface import ChatInterface
 
 def main():
     """アプリケーションのメインエントリーポイント"""
+    # 音声処理のワーカープロセス（spawn）はこのファイルを読み込み直すため、
+    # Gradio やUIの import はここで行い、ワーカーの起動を軽く保つ
+    from src.ui.chat_interface import ChatInterface
+    
     # 特定の警告を抑制
     warnings.filterwarnings("ignore", message="Trying to convert audio automatically")
     
@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import Optional
+from typing import Optional, List
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, validator, ValidationError
 from urllib.parse import urlparse
@@ -11,6 +11,18 @@ load_dotenv()
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
+def _validate_api_url(v: str) -> str:
+    """API URLの形式を検証"""
+    try:
+        result = urlparse(v)
+        if not all([result.scheme, result.netloc]):
+            raise ValueError("無効なURL形式です")
+        if result.scheme not in ['http', 'https']:
+            raise ValueError("URLはhttpまたはhttpsである必要があります")
+        return v
+    except Exception as e:
+        raise ValueError(f"URL検証エラー: {str(e)}")
+
 class AppSettings(BaseModel):
     """アプリケーション設定を管理するクラス"""
     
@@ -19,6 +31,10 @@ class AppSettings(BaseModel):
         default="http://localhost:11434",
         description="Ollama API のURL"
     )
+    ollama_api_urls: List[str] = Field(
+        default_factory=list,
+        description="負荷分散に使用する Ollama API のURL一覧（未指定時は ollama_api_url のみ）"
+    )
     model_name: str = Field(
         default="gemma3",
         description="使用するモデル名"
@@ -54,6 +70,138 @@ class AppSettings(BaseModel):
         description="API リクエストの最大リトライ回数"
     )
     
+    # 時間予算・再試行設定
+    turn_deadline: float = Field(
+        default=90.0,
+        ge=1.0,
+        le=600.0,
+        description="1ターンの応答取得に使える時間予算（秒）。再試行はこの範囲内で行う"
+    )
+    retry_base_delay: float = Field(
+        default=0.25,
+        ge=0.0,
+        le=10.0,
+        description="再試行の初回待機時間（秒）。以降は指数的に増加する"
+    )
+    
+    # サーキットブレーカー設定
+    circuit_failure_threshold: int = Field(
+        default=3,
+        ge=1,
+        le=100,
+        description="エンドポイントを遮断するまでの連続失敗回数"
+    )
+    circuit_reset_timeout: float = Field(
+        default=15.0,
+        ge=1.0,
+        le=600.0,
+        description="遮断後に試行を再開するまでの時間（秒）"
+    )
+    
+    # ヘッジリクエスト設定
+    hedge_delay: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=60.0,
+        description="応答開始がこの秒数を超えたら別のエンドポイントにも送信する（0で無効）"
+    )
+    hedge_workers: int = Field(
+        default=0,
+        ge=0,
+        le=256,
+        description="ヘッジリクエスト用のスレッド数（0でエンドポイント数×4）"
+    )
+    
+    # セッション設定
+    session_db_path: str = Field(
+        default="sessions.db",
+        description="会話履歴を保存するSQLiteデータベースのパス"
+    )
+    session_cache_size: int = Field(
+        default=256,
+        ge=1,
+        le=100000,
+        description="メモリ上に保持するセッション数"
+    )
+    session_ttl_hours: float = Field(
+        default=24.0,
+        gt=0.0,
+        le=24.0 * 365,
+        description="最後のターンからこの時間（時間）を過ぎたセッションを削除する"
+    )
+    session_heartbeat_interval: float = Field(
+        default=10.0,
+        ge=1.0,
+        le=300.0,
+        description="ブラウザからハートビートを送る間隔（秒）"
+    )
+    session_heartbeat_timeout: float = Field(
+        default=30.0,
+        ge=2.0,
+        le=600.0,
+        description="ハートビートがこの秒数途絶えたタブの実行中ターンをキャンセルする（TURN_DEADLINE 未満）"
+    )
+    
+    # 音声処理設定
+    audio_workers: int = Field(
+        default=2,
+        ge=1,
+        le=32,
+        description="音声入力の変換を行うワーカープロセス数"
+    )
+    audio_tts_workers: int = Field(
+        default=2,
+        ge=1,
+        le=32,
+        description="音声合成の速度調整・書き出しを行うワーカープロセス数"
+    )
+    audio_stats_interval: float = Field(
+        default=60.0,
+        ge=0.0,
+        le=3600.0,
+        description="音声処理ワーカーの統計をINFOログに出す間隔（秒、0で無効）"
+    )
+    
+    # ヘルスチェック・負荷分散設定
+    endpoint_load_penalty: int = Field(
+        default=2,
+        ge=0,
+        le=100,
+        description="モデル常駐先の処理中リクエストがこの数を超えたら、未常駐のエンドポイントにも振り分ける"
+    )
+    health_check_interval: float = Field(
+        default=10.0,
+        ge=1.0,
+        le=600.0,
+        description="エンドポイントのヘルスチェック間隔（秒）"
+    )
+    
+    # 自動モデル選択設定
+    auto_small_model: str = Field(
+        default="gemma3:4b",
+        description="自動モード時に短い発話や混雑時に使用する小型モデル"
+    )
+    auto_large_model: str = Field(
+        default="",
+        description="自動モード時に複雑な発話で使用する大型モデル（未指定時は model_name）"
+    )
+    latency_target_p95: float = Field(
+        default=8.0,
+        gt=0.0,
+        le=300.0,
+        description="自動モードで目標とする応答時間のp95（秒）"
+    )
+    auto_complexity_threshold: int = Field(
+        default=60,
+        ge=0,
+        description="この複雑さ未満の発話は小型モデルで処理する"
+    )
+    auto_max_queue_depth: int = Field(
+        default=2,
+        ge=1,
+        description="処理中リクエストがこの数以上の場合は小型モデルで処理する"
+    )
+    
     # ログレベル
     log_level: str = Field(
         default="INFO",
@@ -63,15 +211,23 @@ class AppSettings(BaseModel):
     @validator('ollama_api_url')
     def validate_url(cls, v):
         """URLの形式を検証"""
-        try:
-            result = urlparse(v)
-            if not all([result.scheme, result.netloc]):
-                raise ValueError("無効なURL形式です")
-            if result.scheme not in ['http', 'https']:
-                raise ValueError("URLはhttpまたはhttpsである必要があります")
-            return v
-        except Exception as e:
-            raise ValueError(f"URL検証エラー: {str(e)}")
+        return _validate_api_url(v)
+    
+    @validator('ollama_api_urls', each_item=True)
+    def validate_urls(cls, v):
+        """URL一覧の各要素を検証"""
+        return _validate_api_url(v)
+    
+    @validator('session_heartbeat_timeout')
+    def validate_heartbeat_timeout(cls, v, values):
+        """ハートビートのタイムアウトが送信間隔とターンの時間予算に見合っているか検証"""
+        interval = values.get('session_heartbeat_interval')
+        if interval is not None and v < interval * 2:
+            raise ValueError("SESSION_HEARTBEAT_TIMEOUT は SESSION_HEARTBEAT_INTERVAL の2倍以上である必要があります")
+        deadline = values.get('turn_deadline')
+        if deadline is not None and v >= deadline:
+            raise ValueError("SESSION_HEARTBEAT_TIMEOUT は TURN_DEADLINE より短くする必要があります")
+        return v
     
     @validator('log_level')
     def validate_log_level(cls, v):
@@ -90,11 +246,35 @@ def load_settings() -> AppSettings:
     try:
         settings = AppSettings(
             ollama_api_url=os.getenv("OLLAMA_API_URL", "http://localhost:11434"),
+            ollama_api_urls=[
+                url.strip() for url in os.getenv("OLLAMA_API_URLS", "").split(",") if url.strip()
+            ],
             model_name=os.getenv("MODEL_NAME", "gemma3"),
             default_temperature=float(os.getenv("DEFAULT_TEMPERATURE", "0.7")),
             default_max_tokens=int(os.getenv("DEFAULT_MAX_TOKENS", "2048")),
             api_timeout=int(os.getenv("API_TIMEOUT", "30")),
             max_retries=int(os.getenv("MAX_RETRIES", "3")),
+            turn_deadline=float(os.getenv("TURN_DEADLINE", "90")),
+            retry_base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.25")),
+            circuit_failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3")),
+            circuit_reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "15")),
+            hedge_delay=float(os.getenv("HEDGE_DELAY", "0")),
+            hedge_workers=int(os.getenv("HEDGE_WORKERS", "0")),
+            session_db_path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+            session_cache_size=int(os.getenv("SESSION_CACHE_SIZE", "256")),
+            session_ttl_hours=float(os.getenv("SESSION_TTL_HOURS", "24")),
+            session_heartbeat_interval=float(os.getenv("SESSION_HEARTBEAT_INTERVAL", "10")),
+            session_heartbeat_timeout=float(os.getenv("SESSION_HEARTBEAT_TIMEOUT", "30")),
+            audio_workers=int(os.getenv("AUDIO_WORKERS", "2")),
+            audio_tts_workers=int(os.getenv("AUDIO_TTS_WORKERS", "2")),
+            audio_stats_interval=float(os.getenv("AUDIO_STATS_INTERVAL", "60")),
+            health_check_interval=float(os.getenv("HEALTH_CHECK_INTERVAL", "10")),
+            endpoint_load_penalty=int(os.getenv("ENDPOINT_LOAD_PENALTY", "2")),
+            auto_small_model=os.getenv("AUTO_SMALL_MODEL", "gemma3:4b"),
+            auto_large_model=os.getenv("AUTO_LARGE_MODEL", ""),
+            latency_target_p95=float(os.getenv("LATENCY_TARGET_P95", "8")),
+            auto_complexity_threshold=int(os.getenv("AUTO_COMPLEXITY_THRESHOLD", "60")),
+            auto_max_queue_depth=int(os.getenv("AUTO_MAX_QUEUE_DEPTH", "2")),
             log_level=os.getenv("LOG_LEVEL", "INFO")
         )
         
@@ -120,21 +300,65 @@ try:
     
     # 後方互換性のために既存の変数名を維持
     OLLAMA_API_URL = settings.ollama_api_url
+    OLLAMA_API_URLS = settings.ollama_api_urls or [settings.ollama_api_url]
     MODEL_NAME = settings.model_name
     DEFAULT_TEMPERATURE = settings.default_temperature
     DEFAULT_MAX_TOKENS = settings.default_max_tokens
     API_TIMEOUT = settings.api_timeout
     MAX_RETRIES = settings.max_retries
+    TURN_DEADLINE = settings.turn_deadline
+    RETRY_BASE_DELAY = settings.retry_base_delay
+    CIRCUIT_FAILURE_THRESHOLD = settings.circuit_failure_threshold
+    CIRCUIT_RESET_TIMEOUT = settings.circuit_reset_timeout
+    HEDGE_DELAY = settings.hedge_delay
+    HEDGE_WORKERS = settings.hedge_workers
+    SESSION_DB_PATH = settings.session_db_path
+    SESSION_CACHE_SIZE = settings.session_cache_size
+    SESSION_TTL_HOURS = settings.session_ttl_hours
+    SESSION_HEARTBEAT_INTERVAL = settings.session_heartbeat_interval
+    SESSION_HEARTBEAT_TIMEOUT = settings.session_heartbeat_timeout
+    AUDIO_WORKERS = settings.audio_workers
+    AUDIO_TTS_WORKERS = settings.audio_tts_workers
+    AUDIO_STATS_INTERVAL = settings.audio_stats_interval
+    HEALTH_CHECK_INTERVAL = settings.health_check_interval
+    ENDPOINT_LOAD_PENALTY = settings.endpoint_load_penalty
+    AUTO_SMALL_MODEL = settings.auto_small_model
+    AUTO_LARGE_MODEL = settings.auto_large_model or settings.model_name
+    LATENCY_TARGET_P95 = settings.latency_target_p95
+    AUTO_COMPLEXITY_THRESHOLD = settings.auto_complexity_threshold
+    AUTO_MAX_QUEUE_DEPTH = settings.auto_max_queue_depth
     
 except Exception as e:
     logger.error(f"設定の初期化に失敗しました: {e}")
     # フォールバック設定
     OLLAMA_API_URL = "http://localhost:11434"
+    OLLAMA_API_URLS = [OLLAMA_API_URL]
     MODEL_NAME = "gemma3"
     DEFAULT_TEMPERATURE = 0.7
     DEFAULT_MAX_TOKENS = 2048
     API_TIMEOUT = 30
     MAX_RETRIES = 3
+    TURN_DEADLINE = 90.0
+    RETRY_BASE_DELAY = 0.25
+    CIRCUIT_FAILURE_THRESHOLD = 3
+    CIRCUIT_RESET_TIMEOUT = 15.0
+    HEDGE_DELAY = 0.0
+    HEDGE_WORKERS = 0
+    SESSION_DB_PATH = "sessions.db"
+    SESSION_CACHE_SIZE = 256
+    SESSION_TTL_HOURS = 24.0
+    SESSION_HEARTBEAT_INTERVAL = 10.0
+    SESSION_HEARTBEAT_TIMEOUT = 30.0
+    AUDIO_WORKERS = 2
+    AUDIO_TTS_WORKERS = 2
+    AUDIO_STATS_INTERVAL = 60.0
+    HEALTH_CHECK_INTERVAL = 10.0
+    ENDPOINT_LOAD_PENALTY = 2
+    AUTO_SMALL_MODEL = "gemma3:4b"
+    AUTO_LARGE_MODEL = MODEL_NAME
+    LATENCY_TARGET_P95 = 8.0
+    AUTO_COMPLEXITY_THRESHOLD = 60
+    AUTO_MAX_QUEUE_DEPTH = 2
 
 # 日本語教師のシステムプロンプト
 JAPANESE_TEACHER_SYSTEM_PROMPT = """
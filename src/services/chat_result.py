@@ -0,0 +1,61 @@
+from enum import Enum
+from typing import Optional
+
+
+class ChatStatus(str, Enum):
+    """チャット応答の取得結果の種類"""
+    OK = "ok"
+    CANCELLED = "cancelled"
+    MODEL_NOT_FOUND = "model_not_found"
+    SERVER_ERROR = "server_error"
+    CONNECTION_ERROR = "connection_error"
+    TIMEOUT = "timeout"
+    CIRCUIT_OPEN = "circuit_open"
+    INVALID_RESPONSE = "invalid_response"
+    ERROR = "error"
+
+
+# 残り時間があれば再試行してよい結果
+RETRYABLE_STATUSES = frozenset({
+    ChatStatus.SERVER_ERROR,
+    ChatStatus.CONNECTION_ERROR,
+    ChatStatus.TIMEOUT,
+})
+
+
+class ChatResult:
+    """チャット応答の取得結果
+
+    status が OK の場合 content は応答本文、それ以外の場合はユーザー向けのエラーメッセージを保持する。
+    """
+
+    def __init__(self, status: ChatStatus, content: str = "", model: Optional[str] = None,
+                 endpoint: Optional[str] = None, latency: float = 0.0, attempts: int = 1,
+                 retryable: Optional[bool] = None):
+        self.status = status
+        self.content = content
+        self.model = model
+        self.endpoint = endpoint
+        self.latency = latency
+        self.attempts = attempts
+        # None の場合は status から判定する（モデル固有のサーバーエラーなどは False を指定）
+        self._retryable = retryable
+
+    @property
+    def ok(self) -> bool:
+        """応答の取得に成功したかどうか"""
+        return self.status == ChatStatus.OK
+
+    @property
+    def retryable(self) -> bool:
+        """再試行の対象となる失敗かどうか"""
+        if self._retryable is not None:
+            return self._retryable
+        return self.status in RETRYABLE_STATUSES
+
+    def __str__(self) -> str:
+        return self.content
+
+    def __repr__(self) -> str:
+        return (f"ChatResult(status={self.status.value}, model={self.model!r}, endpoint={self.endpoint!r}, "
+                f"latency={self.latency:.2f}, attempts={self.attempts})")
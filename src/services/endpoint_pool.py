@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set
+
+import requests
+
+from src.services.resilience import CircuitBreaker
+
+
+def normalize_model_name(name: str) -> str:
+    """タグを省略したモデル名を、Ollamaと同じく :latest 付きの名前にそろえる"""
+    if ":" in name.rsplit("/", 1)[-1]:
+        return name
+    return f"{name}:latest"
+
+
+class OllamaEndpoint:
+    """単一のOllamaエンドポイントの状態を保持するクラス"""
+
+    def __init__(self, url: str, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.url = url.rstrip("/")
+        self.breaker = CircuitBreaker(self.url, failure_threshold, reset_timeout)
+        self.healthy = True  # 初回ヘルスチェックまでは利用可能とみなす
+        self.available_models: Set[str] = set()
+        self.loaded_models: Set[str] = set()
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.last_checked: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return (f"OllamaEndpoint(url={self.url!r}, healthy={self.healthy}, "
+                f"in_flight={self.in_flight}, breaker={self.breaker.state}, "
+                f"loaded={sorted(self.loaded_models)})")
+
+
+class OllamaEndpointPool:
+    """複数のOllamaエンドポイントを管理し、負荷の低いものへリクエストを振り分けるクラス"""
+
+    def __init__(self, urls: List[str], session: requests.Session,
+                 check_interval: float = 10.0, check_timeout: float = 5.0,
+                 failure_threshold: int = 3, reset_timeout: float = 15.0,
+                 load_penalty: int = 2):
+        if not urls:
+            raise ValueError("エンドポイントが1つも指定されていません")
+        self.logger = logging.getLogger(__name__)
+        self.endpoints = [OllamaEndpoint(url, failure_threshold, reset_timeout) for url in urls]
+        self.session = session
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        # モデルが常駐していないエンドポイントに上乗せする負荷。常駐先の処理中リクエストが
+        # これを超えると、未常駐でも空いているエンドポイントへ振り分ける
+        self.load_penalty = load_penalty
+        # 停止中のホストが他のホストのヘルスチェックを遅らせないよう並列に実行する
+        self._check_executor = ThreadPoolExecutor(
+            max_workers=len(self.endpoints), thread_name_prefix="ollama-health-check"
+        )
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """バックグラウンドのヘルスチェックを開始する"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.check_all()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._health_check_loop, name="ollama-health-check", daemon=True
+        )
+        self._thread.start()
+        self.logger.info(f"ヘルスチェック開始: {len(self.endpoints)} エンドポイント, 間隔 {self.check_interval}秒")
+
+    def stop(self) -> None:
+        """バックグラウンドのヘルスチェックを停止する"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.check_timeout)
+            self._thread = None
+
+    def _health_check_loop(self) -> None:
+        while not self._stop_event.wait(self.check_interval):
+            self.check_all()
+
+    def check_all(self) -> None:
+        """すべてのエンドポイントのヘルスチェックを並列に実行する"""
+        list(self._check_executor.map(self.check_endpoint, self.endpoints))
+
+    def check_endpoint(self, endpoint: OllamaEndpoint) -> bool:
+        """/api/tags と /api/ps でエンドポイントの状態と常駐モデルを取得する"""
+        try:
+            response = self.session.get(f"{endpoint.url}/api/tags", timeout=self.check_timeout)
+            response.raise_for_status()
+            available = {normalize_model_name(m["name"]) for m in response.json().get("models", [])}
+
+            # 常駐中のモデルは /api/ps で取得（古いOllamaでは存在しないため失敗は無視）
+            loaded: Set[str] = set()
+            try:
+                ps_response = self.session.get(f"{endpoint.url}/api/ps", timeout=self.check_timeout)
+                if ps_response.status_code == 200:
+                    loaded = {normalize_model_name(m["name"]) for m in ps_response.json().get("models", [])}
+            except (requests.exceptions.RequestException, ValueError, KeyError):
+                pass
+
+            with self._lock:
+                if not endpoint.healthy:
+                    self.logger.info(f"エンドポイントが復旧: {endpoint.url}")
+                endpoint.healthy = True
+                endpoint.available_models = available
+                endpoint.loaded_models = loaded
+                endpoint.consecutive_failures = 0
+                endpoint.last_checked = time.time()
+            # 遮断の解除はチャットリクエストの成功時のみ行う
+            endpoint.breaker.record_probe_success()
+            return True
+
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            self.mark_failure(endpoint, e)
+            with self._lock:
+                endpoint.last_checked = time.time()
+            return False
+
+    def mark_failure(self, endpoint: OllamaEndpoint, error: Optional[Exception] = None) -> None:
+        """エンドポイントを異常として記録する"""
+        with self._lock:
+            if endpoint.healthy:
+                self.logger.warning(f"エンドポイントを除外: {endpoint.url} - {str(error)}")
+            endpoint.healthy = False
+            endpoint.consecutive_failures += 1
+        endpoint.breaker.record_failure()
+
+    def record_request_failure(self, endpoint: OllamaEndpoint) -> None:
+        """タイムアウトやサーバーエラーなど、接続はできたが失敗したリクエストを記録する"""
+        endpoint.breaker.record_failure()
+
+    def record_request_success(self, endpoint: OllamaEndpoint) -> None:
+        """成功したリクエストを記録する"""
+        endpoint.breaker.record_success()
+
+    def candidates(self, model: Optional[str] = None) -> List[OllamaEndpoint]:
+        """リクエスト先の候補を優先度順に返す
+
+        処理中リクエスト数に、モデルが常駐していない場合は load_penalty（モデル一覧が未取得ならさらに+1）を
+        加えた値が小さいものを優先し、同値ならモデル常駐を優先する。モデルが導入されていないことが
+        分かっているエンドポイントは最後に回す。モデル名はタグを省略した場合 :latest とみなして比較する。
+        正常なエンドポイントがない場合は、復旧している可能性があるため全エンドポイントを返す。
+        サーキットブレーカーが開いているエンドポイントは除外するため、空のリストを返すことがある。
+        """
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.healthy]
+            pool = healthy if healthy else list(self.endpoints)
+            pool = [e for e in pool if e.breaker.allow_request()]
+
+            name = normalize_model_name(model) if model else None
+
+            def rank(endpoint: OllamaEndpoint):
+                if not name or name in endpoint.loaded_models:
+                    residency = 0
+                elif name in endpoint.available_models:
+                    residency = 1
+                elif not endpoint.available_models:
+                    residency = 2  # モデル一覧が未取得
+                else:
+                    residency = 3
+                penalty = 0 if residency == 0 else self.load_penalty + (residency - 1)
+                return (residency == 3, endpoint.in_flight + penalty, residency)
+
+            return sorted(pool, key=rank)
+
+    def acquire(self, endpoint: OllamaEndpoint) -> bool:
+        """サーキットブレーカーの送信権を取得し、処理中リクエスト数を加算する
+
+        half_open の試行リクエストを他のリクエストが使っている場合は False を返す。
+        """
+        if not endpoint.breaker.try_acquire():
+            return False
+        with self._lock:
+            endpoint.in_flight += 1
+        return True
+
+    def release(self, endpoint: OllamaEndpoint) -> None:
+        """処理中リクエスト数を減算し、結果が記録されていない試行リクエストの送信権を返す"""
+        with self._lock:
+            endpoint.in_flight = max(endpoint.in_flight - 1, 0)
+        endpoint.breaker.release_trial()
+
+    def mark_model_loaded(self, endpoint: OllamaEndpoint, model: str) -> None:
+        """応答を返したエンドポイントにモデルが常駐しているものとして記録する"""
+        name = normalize_model_name(model)
+        with self._lock:
+            endpoint.loaded_models.add(name)
+            endpoint.available_models.add(name)
+
+    def available_models(self) -> List[str]:
+        """正常なエンドポイントで利用可能なモデルの一覧を返す"""
+        with self._lock:
+            models: Set[str] = set()
+            for endpoint in self.endpoints:
+                if endpoint.healthy:
+                    models |= endpoint.available_models
+            return sorted(models)
+
+    def least_in_flight(self, model: Optional[str] = None) -> int:
+        """モデルの送信先として最優先の候補の処理中リクエスト数を返す"""
+        candidates = self.candidates(model)
+        return candidates[0].in_flight if candidates else 0
+
+    def total_in_flight(self) -> int:
+        """全エンドポイントで処理中のリクエスト数を返す"""
+        with self._lock:
+            return sum(e.in_flight for e in self.endpoints)
+
+    def healthy_count(self) -> int:
+        """正常なエンドポイント数を返す"""
+        with self._lock:
+            return sum(1 for e in self.endpoints if e.healthy)
@@ -0,0 +1,110 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.services.endpoint_pool import normalize_model_name
+
+# モデル選択で「自動」を表す値
+AUTO_MODEL = "auto"
+
+
+class ModelRouter:
+    """発話の複雑さ・キュー深さ・レイテンシ目標に基づき、小型/大型モデルを選択するクラス"""
+
+    def __init__(self, small_model: str, large_model: str, latency_target: float,
+                 complexity_threshold: int = 60, max_queue_depth: int = 2,
+                 window_size: int = 50, sample_max_age: float = 300.0):
+        self.logger = logging.getLogger(__name__)
+        self.small_model = small_model
+        self.large_model = large_model
+        self.latency_target = latency_target
+        self.complexity_threshold = complexity_threshold
+        self.max_queue_depth = max_queue_depth
+        # SLO超過で大型モデルが選ばれなくなっても、古い観測値が消えれば再び試行される
+        self.sample_max_age = sample_max_age
+        self._latencies: Dict[str, Deque[Tuple[float, float]]] = {
+            small_model: deque(maxlen=window_size),
+            large_model: deque(maxlen=window_size),
+        }
+        self._window_size = window_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_complexity(message: str) -> int:
+        """発話の複雑さを文字数と文・節の数から概算する"""
+        if not message:
+            return 0
+        text = message.strip()
+        # 句読点で区切られた節が多いほど複雑とみなす
+        clauses = [c for c in re.split(r'[、。，．,.!?！？\n]+', text) if c.strip()]
+        return len(text) + 15 * max(len(clauses) - 1, 0)
+
+    def p95_latency(self, model: str) -> Optional[float]:
+        """観測済みレイテンシのp95を返す（サンプル不足時はNone）"""
+        cutoff = time.time() - self.sample_max_age
+        with self._lock:
+            samples = sorted(latency for observed_at, latency in self._latencies.get(model, ())
+                             if observed_at >= cutoff)
+        if len(samples) < 5:
+            return None
+        index = min(int(len(samples) * 0.95), len(samples) - 1)
+        return samples[index]
+
+    @staticmethod
+    def _is_installed(model: str, available_models: List[str]) -> bool:
+        """モデルが導入済みか（タグ省略時は :latest とみなす）"""
+        name = normalize_model_name(model)
+        return any(normalize_model_name(m) == name for m in available_models)
+
+    def _resolve_installed(self, model: str, reason: str, available_models: Optional[List[str]]) -> Tuple[str, str]:
+        """選択したモデルが導入されていない場合、導入済みのモデルに切り替える"""
+        if not available_models or self._is_installed(model, available_models):
+            return model, reason
+        other = self.large_model if model == self.small_model else self.small_model
+        if self._is_installed(other, available_models):
+            return other, f"{reason}:fallback_not_installed"
+        return available_models[0], f"{reason}:fallback_not_installed"
+
+    def select_model(self, message: str, queue_depth: int = 0,
+                     available_models: Optional[List[str]] = None) -> Tuple[str, str]:
+        """使用するモデルと選択理由を返す
+
+        queue_depth には大型モデルの送信先候補で最も空いているエンドポイントの処理中リクエスト数を渡す。
+        available_models を渡すと、導入されていないモデルは選ばない。
+        """
+        complexity = self.estimate_complexity(message)
+        large_p95 = self.p95_latency(self.large_model)
+
+        if complexity < self.complexity_threshold:
+            model, reason = self.small_model, "short_utterance"
+        elif queue_depth >= self.max_queue_depth:
+            model, reason = self.small_model, "queue_busy"
+        elif large_p95 is not None and large_p95 > self.latency_target:
+            model, reason = self.small_model, "slo_exceeded"
+        else:
+            model, reason = self.large_model, "complex_utterance"
+        model, reason = self._resolve_installed(model, reason, available_models)
+
+        p95_text = f"{large_p95:.2f}" if large_p95 is not None else "n/a"
+        self.logger.info(
+            f"ルーティング: model={model} reason={reason} complexity={complexity} "
+            f"queue_depth={queue_depth} large_p95={p95_text} target={self.latency_target:.2f}"
+        )
+        return model, reason
+
+    def record_latency(self, model: str, latency: float, failed: bool = False) -> None:
+        """観測したレイテンシを記録する
+
+        失敗（タイムアウト等）したターンはSLO未達として、少なくとも目標値のレイテンシで記録する。
+        """
+        if failed:
+            latency = max(latency, self.latency_target)
+        with self._lock:
+            samples = self._latencies.setdefault(model, deque(maxlen=self._window_size))
+            samples.append((time.time(), latency))
+        p95 = self.p95_latency(model)
+        p95_text = f"{p95:.2f}" if p95 is not None else "n/a"
+        self.logger.info(f"レイテンシ観測: model={model} latency={latency:.2f} failed={failed} p95={p95_text}")
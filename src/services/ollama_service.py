@@ -3,12 +3,21 @@ import json
 import re
 import logging
 import time
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Tuple
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from src.config.settings import (
-    OLLAMA_API_URL, MODEL_NAME, JAPANESE_TEACHER_SYSTEM_PROMPT, 
-    ENGLISH_TEACHER_SYSTEM_PROMPT, API_TIMEOUT, MAX_RETRIES
+    OLLAMA_API_URLS, MODEL_NAME, JAPANESE_TEACHER_SYSTEM_PROMPT, 
+    ENGLISH_TEACHER_SYSTEM_PROMPT, API_TIMEOUT, MAX_RETRIES, HEALTH_CHECK_INTERVAL,
+    AUTO_SMALL_MODEL, AUTO_LARGE_MODEL, LATENCY_TARGET_P95, AUTO_COMPLEXITY_THRESHOLD,
+    AUTO_MAX_QUEUE_DEPTH, TURN_DEADLINE, RETRY_BASE_DELAY, CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT, HEDGE_DELAY, HEDGE_WORKERS, ENDPOINT_LOAD_PENALTY
 )
+from src.services.endpoint_pool import OllamaEndpoint, OllamaEndpointPool
+from src.services.model_router import ModelRouter, AUTO_MODEL
+from src.services.chat_result import ChatResult, ChatStatus
+from src.services.resilience import Deadline
 
 class OllamaAPIError(Exception):
     """Ollama API関連のエラー"""
@@ -22,44 +31,231 @@ class OllamaTimeoutError(OllamaAPIError):
     """Ollamaタイムアウトエラー"""
     pass
 
+class CircuitOpenError(OllamaAPIError):
+    """すべてのエンドポイントでサーキットブレーカーが開いている"""
+    pass
+
+class GenerationCancelledError(OllamaAPIError):
+    """生成がユーザー操作によりキャンセルされた"""
+    
+    def __init__(self, message: str, wasted_tokens: int = 0):
+        super().__init__(message)
+        self.wasted_tokens = wasted_tokens
+
 class OllamaService:
     """Ollama APIと通信するためのサービスクラス"""
     
-    def __init__(self):
+    # 再試行するために最低限必要な残り時間（秒）
+    MIN_ATTEMPT_TIME = 1.0
+    
+    # 選択されたモデル自体が原因のOllamaのエラーメッセージ
+    # （"llama runner process has terminated" や過負荷はホスト側の障害として再試行・遮断の対象にする）
+    MODEL_ERROR_MESSAGES = (
+        "requires more system memory",
+        "error loading model",
+        "unable to load model",
+    )
+    
+    def __init__(self, api_urls: Optional[List[str]] = None):
         self.logger = logging.getLogger(__name__)
         self.session = requests.Session()
         self.session.timeout = API_TIMEOUT
+        
+        # 複数エンドポイントのヘルスチェックと負荷分散
+        self.endpoint_pool = OllamaEndpointPool(
+            api_urls or OLLAMA_API_URLS,
+            self.session,
+            check_interval=HEALTH_CHECK_INTERVAL,
+            check_timeout=min(API_TIMEOUT, 5),
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=CIRCUIT_RESET_TIMEOUT,
+            load_penalty=ENDPOINT_LOAD_PENALTY
+        )
+        self.endpoint_pool.start()
+        
+        # ヘッジリクエスト用のスレッドプール（HEDGE_DELAY が 0 の場合は使用しない）
+        # スレッドが足りないと主リクエストの送信自体が待たされるため、エンドポイント数に合わせる
+        self._hedge_executor = None
+        if HEDGE_DELAY > 0:
+            hedge_workers = HEDGE_WORKERS or len(self.endpoint_pool.endpoints) * 4
+            self._hedge_executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="ollama-hedge")
+        
+        # キャンセルにより破棄されたトークン数の累計
+        self.wasted_tokens_total = 0
+        self._stats_lock = threading.Lock()
+        
+        # 「自動」モデル選択用のルーター
+        self.model_router = ModelRouter(
+            AUTO_SMALL_MODEL,
+            AUTO_LARGE_MODEL,
+            LATENCY_TARGET_P95,
+            complexity_threshold=AUTO_COMPLEXITY_THRESHOLD,
+            max_queue_depth=AUTO_MAX_QUEUE_DEPTH
+        )
     
     @retry(
         stop=stop_after_attempt(MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type((requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        wait=wait_exponential(multiplier=RETRY_BASE_DELAY, max=2),
+        retry=retry_if_exception_type(OllamaConnectionError),
+        reraise=True
     )
     def get_available_models(self) -> List[str]:
-        """利用可能なモデルの一覧を取得する"""
+        """利用可能なモデルの一覧を取得する（全エンドポイントの和集合）"""
         try:
-            self.logger.debug(f"モデル一覧を取得中: {OLLAMA_API_URL}/api/tags")
-            response = self.session.get(f"{OLLAMA_API_URL}/api/tags", timeout=API_TIMEOUT)
-            
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                model_names = [m["name"] for m in models]
-                self.logger.info(f"利用可能なモデル数: {len(model_names)}")
-                return model_names
-            else:
-                self.logger.warning(f"モデル一覧の取得に失敗: HTTP {response.status_code}")
-                return []
+            self.logger.debug(f"モデル一覧を取得中: {len(self.endpoint_pool.endpoints)} エンドポイント")
+            self.endpoint_pool.check_all()
+            
+            if self.endpoint_pool.healthy_count() == 0:
+                self.logger.error("すべてのOllamaエンドポイントへの接続に失敗")
+                raise OllamaConnectionError("Ollamaサーバーに接続できません")
+            
+            model_names = self.endpoint_pool.available_models()
+            self.logger.info(f"利用可能なモデル数: {len(model_names)}")
+            return model_names
                 
-        except requests.exceptions.ConnectionError as e:
-            self.logger.error(f"Ollamaサーバーへの接続に失敗: {str(e)}")
-            raise OllamaConnectionError(f"Ollamaサーバーに接続できません: {str(e)}")
-        except requests.exceptions.Timeout as e:
-            self.logger.error(f"モデル一覧取得がタイムアウト: {str(e)}")
-            raise OllamaTimeoutError(f"リクエストがタイムアウトしました: {str(e)}")
+        except OllamaAPIError:
+            raise
         except Exception as e:
             self.logger.error(f"予期しないエラーが発生: {str(e)}")
             return []
     
+    def _post_to(self, endpoint: OllamaEndpoint, path: str, data: Dict[str, Any], timeout: float) -> requests.Response:
+        """指定したエンドポイントにストリーミングでPOSTする
+        
+        成功時はエンドポイントが処理中として計上されたままなので、呼び出し元で release すること。
+        """
+        if not self.endpoint_pool.acquire(endpoint):
+            raise CircuitOpenError(f"{endpoint.url} は半開状態で試行リクエストを処理中です")
+        try:
+            self.logger.debug(f"リクエスト送信先: {endpoint.url} (処理中: {endpoint.in_flight})")
+            return self.session.post(
+                f"{endpoint.url}{path}", 
+                json=data, 
+                timeout=timeout,
+                stream=True
+            )
+        except requests.exceptions.ConnectionError as e:
+            self.endpoint_pool.mark_failure(endpoint, e)
+            self.endpoint_pool.release(endpoint)
+            raise
+        except requests.exceptions.Timeout:
+            self.endpoint_pool.record_request_failure(endpoint)
+            self.endpoint_pool.release(endpoint)
+            raise
+        except Exception:
+            self.endpoint_pool.release(endpoint)
+            raise
+    
+    def _post_with_failover(self, candidates: List[OllamaEndpoint], path: str, data: Dict[str, Any],
+                            deadline: Deadline) -> Tuple[requests.Response, OllamaEndpoint]:
+        """負荷の低いエンドポイントから順にPOSTし、接続エラー時は次の候補へフェイルオーバーする"""
+        last_error: Optional[Exception] = None
+        
+        for endpoint in candidates:
+            if deadline.expired():
+                break
+            try:
+                return self._post_to(endpoint, path, data, deadline.timeout(API_TIMEOUT)), endpoint
+            except requests.exceptions.ConnectionError as e:
+                self.logger.warning(f"フェイルオーバー: {endpoint.url} に接続できません")
+                last_error = e
+            except CircuitOpenError as e:
+                # 半開状態の試行枠を他のリクエストが使っている
+                last_error = e
+        
+        raise last_error or requests.exceptions.Timeout("ターンの時間予算を使い切りました")
+    
+    def _hedged_post(self, candidates: List[OllamaEndpoint], path: str, data: Dict[str, Any],
+                     deadline: Deadline) -> Tuple[requests.Response, OllamaEndpoint]:
+        """主エンドポイントの応答が HEDGE_DELAY 以内に始まらない場合、次の候補にも同じリクエストを送る
+        
+        先に応答が始まった方を採用し、もう一方は応答が届き次第閉じる。
+        """
+        primary, backup = candidates[0], candidates[1]
+        futures: Dict[Future, OllamaEndpoint] = {
+            self._hedge_executor.submit(self._post_to, primary, path, data, deadline.timeout(API_TIMEOUT)): primary
+        }
+        
+        done, _ = wait(futures, timeout=min(HEDGE_DELAY, deadline.remaining()))
+        primary_failed = any(f.exception() is not None for f in done)
+        if (not done or primary_failed) and not deadline.expired():
+            self.logger.info(f"ヘッジリクエスト送信: {backup.url} (主: {primary.url})")
+            futures[self._hedge_executor.submit(
+                self._post_to, backup, path, data, deadline.timeout(API_TIMEOUT)
+            )] = backup
+        
+        winner: Optional[Tuple[requests.Response, OllamaEndpoint]] = None
+        last_error: Optional[BaseException] = None
+        pending = set(futures)
+        
+        while pending and winner is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is not None:
+                    last_error = error
+                elif winner is None:
+                    winner = (future.result(), futures[future])
+                else:
+                    self._discard_hedge(future, futures[future])
+        
+        # 採用されなかったリクエストは完了し次第破棄する
+        for future in pending:
+            future.add_done_callback(lambda f, endpoint=futures[future]: self._discard_hedge(f, endpoint))
+        
+        if winner is None:
+            raise last_error
+        return winner
+    
+    def _discard_hedge(self, future: Future, endpoint: OllamaEndpoint) -> None:
+        """採用されなかったヘッジリクエストの接続を閉じる"""
+        if future.exception() is not None:
+            return
+        future.result().close()
+        self.endpoint_pool.release(endpoint)
+        self.logger.debug(f"ヘッジリクエストを破棄: {endpoint.url}")
+    
+    def _read_chat_stream(self, response: requests.Response, cancel_event: Optional[threading.Event],
+                          deadline: Deadline) -> str:
+        """ストリーミング応答を読み取り、キャンセルまたは時間切れの場合は接続を閉じて中断する"""
+        parts: List[str] = []
+        generated_tokens = 0
+        
+        # 1トークン分程度のチャンクで読み、キャンセルを素早く検知する
+        for line in response.iter_lines(chunk_size=128):
+            if cancel_event is not None and cancel_event.is_set():
+                response.close()
+                self._report_wasted_tokens(generated_tokens)
+                raise GenerationCancelledError("生成がキャンセルされました", wasted_tokens=generated_tokens)
+            
+            if deadline.expired():
+                response.close()
+                raise OllamaTimeoutError(f"ターンの時間予算（{deadline.budget}秒）を超過しました")
+            
+            if not line:
+                continue
+            
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise OllamaAPIError(chunk["error"])
+            
+            parts.append(chunk.get("message", {}).get("content", ""))
+            if chunk.get("done"):
+                # 最終チャンクには正確な生成トークン数が含まれる
+                generated_tokens = chunk.get("eval_count", generated_tokens)
+                break
+            generated_tokens += 1
+        
+        self.logger.debug(f"生成トークン数: {generated_tokens}")
+        return "".join(parts)
+    
+    def _report_wasted_tokens(self, tokens: int) -> None:
+        """キャンセルにより無駄になったトークン数を記録する"""
+        with self._stats_lock:
+            self.wasted_tokens_total += tokens
+            total = self.wasted_tokens_total
+        self.logger.info(f"生成をキャンセル: 破棄トークン数={tokens} (累計 {total})")
+    
     @staticmethod
     def remove_markdown(text):
         """テキストからMarkdown形式と<think>タグ内の内容を除去する"""
@@ -95,11 +291,42 @@ class OllamaService:
         
         return text
     
-    @retry(
-        stop=stop_after_attempt(MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type((requests.exceptions.ConnectionError, requests.exceptions.Timeout))
-    )
+    @classmethod
+    def _is_model_error(cls, error_text: str) -> bool:
+        """サーバーエラーが選択されたモデル固有の問題（読み込み失敗・メモリ不足）かどうか"""
+        text = (error_text or "").lower()
+        return any(message in text for message in cls.MODEL_ERROR_MESSAGES)
+    
+    def _model_error_result(self, model: str, endpoint: OllamaEndpoint) -> ChatResult:
+        """モデル固有のサーバーエラーの結果を返す
+        
+        利用者が選んだモデルの問題なので、再試行せず、エンドポイントのサーキットブレーカーにも数えない。
+        """
+        error_msg = f"モデル '{model}' の読み込みまたは実行に失敗しました。メモリ不足の可能性があるため、より小さなモデルを選択してください。"
+        return ChatResult(ChatStatus.SERVER_ERROR, error_msg, model=model, endpoint=endpoint.url, retryable=False)
+    
+    def _build_messages(self, message: str, history: List[tuple], is_teacher_mode: bool,
+                        language: str) -> List[Dict[str, str]]:
+        """チャット履歴とシステムプロンプトからAPIに送るメッセージを組み立てる"""
+        messages = []
+        
+        # システムプロンプトを追加（教師モードの場合）
+        if is_teacher_mode:
+            system_prompt = (JAPANESE_TEACHER_SYSTEM_PROMPT if language == "ja" 
+                           else ENGLISH_TEACHER_SYSTEM_PROMPT)
+            system_prompt += "\n\n重要: 絶対に '*', '_', '`', '#', '>' のようなMarkdown記法や絵文字は使わないでください。通常のプレーンテキストで返答してください。"
+            messages.append({"role": "system", "content": system_prompt})
+        
+        # 過去の会話履歴を追加
+        for human, ai in history:
+            messages.append({"role": "user", "content": human})
+            if ai:  # AIの応答がある場合
+                messages.append({"role": "assistant", "content": ai})
+        
+        # 新しいメッセージを追加
+        messages.append({"role": "user", "content": message})
+        return messages
+    
     def get_chat_response(
         self, 
         message: str, 
@@ -108,94 +335,172 @@ class OllamaService:
         temperature: float = 0.7, 
         max_tokens: int = 2048, 
         is_teacher_mode: bool = True, 
-        language: str = "ja"
-    ) -> str:
-        """チャットの応答を取得する"""
-        start_time = time.time()
+        language: str = "ja",
+        cancel_event: Optional[threading.Event] = None
+    ) -> ChatResult:
+        """チャットの応答を取得する
         
-        try:
-            # チャット履歴を整形
-            messages = []
-            
-            # システムプロンプトを追加（教師モードの場合）
-            if is_teacher_mode:
-                system_prompt = (JAPANESE_TEACHER_SYSTEM_PROMPT if language == "ja" 
-                               else ENGLISH_TEACHER_SYSTEM_PROMPT)
-                system_prompt += "\n\n重要: 絶対に '*', '_', '`', '#', '>' のようなMarkdown記法や絵文字は使わないでください。通常のプレーンテキストで返答してください。"
-                messages.append({"role": "system", "content": system_prompt})
-            
-            # 過去の会話履歴を追加
-            for human, ai in history:
-                messages.append({"role": "user", "content": human})
-                if ai:  # AIの応答がある場合
-                    messages.append({"role": "assistant", "content": ai})
-            
-            # 新しいメッセージを追加
-            messages.append({"role": "user", "content": message})
-            
-            # APIリクエストを準備
-            data = {
-                "model": model,
-                "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": max_tokens
-                }
+        TURN_DEADLINE 秒の時間予算内で再試行し、結果を ChatResult として返す。
+        cancel_event がセットされると生成を中断し、CANCELLED の結果を返す。
+        """
+        deadline = Deadline(TURN_DEADLINE)
+        
+        # 自動モードの場合は発話と負荷に応じてモデルを選択
+        auto_routed = model == AUTO_MODEL
+        if auto_routed:
+            model, _ = self.model_router.select_model(
+                message,
+                queue_depth=self.endpoint_pool.least_in_flight(self.model_router.large_model),
+                available_models=self.endpoint_pool.available_models()
+            )
+        
+        # APIリクエストを準備
+        data = {
+            "model": model,
+            "messages": self._build_messages(message, history, is_teacher_mode, language),
+            "stream": True,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
             }
+        }
+        
+        self.logger.debug(f"チャット応答を要求中 - モデル: {model}, メッセージ長: {len(message)}")
+        
+        result = self._chat_with_retries(data, model, deadline, cancel_event)
+        
+        if auto_routed and result.status != ChatStatus.CANCELLED:
+            # 失敗したターンも記録し、p95がタイムアウト等のテールを見落とさないようにする
+            self.model_router.record_latency(model, result.latency, failed=not result.ok)
+        return result
+    
+    def _chat_with_retries(self, data: Dict[str, Any], model: str, deadline: Deadline,
+                           cancel_event: Optional[threading.Event]) -> ChatResult:
+        """時間予算の範囲内で指数バックオフしながらチャット応答の取得を試行する"""
+        attempt = 0
+        last_failure: Optional[ChatResult] = None
+        while True:
+            attempt += 1
+            result = self._attempt_chat(data, model, deadline, cancel_event)
+            result.attempts = attempt
+            result.latency = deadline.elapsed()
             
-            self.logger.debug(f"チャット応答を要求中 - モデル: {model}, メッセージ長: {len(message)}")
+            if result.ok:
+                self.logger.info(f"応答時間: {result.latency:.2f}秒 (試行 {attempt} 回)")
+                return result
             
-            response = self.session.post(
-                f"{OLLAMA_API_URL}/api/chat", 
-                json=data, 
-                timeout=API_TIMEOUT
-            )
+            # 遮断は直前の失敗の結果なので、利用者には元の失敗を返す
+            if result.status == ChatStatus.CIRCUIT_OPEN and last_failure is not None:
+                last_failure.latency = result.latency
+                return last_failure
             
-            response_time = time.time() - start_time
-            self.logger.info(f"応答時間: {response_time:.2f}秒")
+            # MAX_RETRIES は get_available_models と同じく総試行回数として扱う
+            if not result.retryable or attempt >= max(MAX_RETRIES, 1):
+                return result
+            last_failure = result
             
-            if response.status_code == 200:
-                response_data = response.json()
-                content = response_data["message"]["content"]
-                
-                # Markdown形式を除去
-                content = self.remove_markdown(content)
-                
-                self.logger.debug(f"応答長: {len(content)} 文字")
-                return content
-                
-            elif response.status_code == 404:
-                error_msg = f"モデル '{model}' が見つかりません。利用可能なモデルを確認してください。"
-                self.logger.error(error_msg)
-                return error_msg
-                
-            elif response.status_code == 500:
-                error_msg = "Ollamaサーバーで内部エラーが発生しました。モデルが正しく読み込まれているか確認してください。"
-                self.logger.error(f"サーバーエラー: {response.text}")
-                return error_msg
-                
+            # 残り時間の範囲内で指数バックオフして再試行
+            delay = RETRY_BASE_DELAY * (2 ** (attempt - 1))
+            if deadline.remaining() < delay + self.MIN_ATTEMPT_TIME:
+                self.logger.warning(f"時間予算が不足しているため再試行しません (残り {deadline.remaining():.2f}秒)")
+                return result
+            
+            self.logger.info(f"再試行します ({result.status.value}): {delay:.2f}秒後, 残り {deadline.remaining():.2f}秒")
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    return ChatResult(ChatStatus.CANCELLED, model=model, latency=deadline.elapsed(), attempts=attempt)
             else:
-                error_msg = f"APIエラー (HTTP {response.status_code}): {response.text}"
-                self.logger.error(error_msg)
-                return error_msg
+                time.sleep(delay)
+    
+    def _attempt_chat(self, data: Dict[str, Any], model: str, deadline: Deadline,
+                      cancel_event: Optional[threading.Event]) -> ChatResult:
+        """チャット応答の取得を1回試行する"""
+        endpoint: Optional[OllamaEndpoint] = None
+        
+        try:
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelledError("送信前にキャンセルされました")
+            
+            candidates = self.endpoint_pool.candidates(model)
+            if not candidates:
+                raise CircuitOpenError("すべてのエンドポイントが遮断中です")
+            
+            if self._hedge_executor is not None and len(candidates) > 1:
+                response, endpoint = self._hedged_post(candidates, "/api/chat", data, deadline)
+            else:
+                response, endpoint = self._post_with_failover(candidates, "/api/chat", data, deadline)
+            
+            try:
+                if response.status_code == 200:
+                    content = self._read_chat_stream(response, cancel_event, deadline)
+                    self.endpoint_pool.mark_model_loaded(endpoint, model)
+                    self.endpoint_pool.record_request_success(endpoint)
+                    
+                    # Markdown形式を除去
+                    content = self.remove_markdown(content)
+                    
+                    self.logger.debug(f"応答長: {len(content)} 文字")
+                    return ChatResult(ChatStatus.OK, content, model=model, endpoint=endpoint.url)
+                    
+                elif response.status_code == 404:
+                    error_msg = f"モデル '{model}' が見つかりません。利用可能なモデルを確認してください。"
+                    self.logger.error(error_msg)
+                    return ChatResult(ChatStatus.MODEL_NOT_FOUND, error_msg, model=model, endpoint=endpoint.url)
+                    
+                elif response.status_code >= 500:
+                    self.logger.error(f"サーバーエラー: {response.text}")
+                    if self._is_model_error(response.text):
+                        return self._model_error_result(model, endpoint)
+                    error_msg = "Ollamaサーバーで内部エラーが発生しました。モデルが正しく読み込まれているか確認してください。"
+                    self.endpoint_pool.record_request_failure(endpoint)
+                    return ChatResult(ChatStatus.SERVER_ERROR, error_msg, model=model, endpoint=endpoint.url)
+                    
+                else:
+                    error_msg = f"APIエラー (HTTP {response.status_code}): {response.text}"
+                    self.logger.error(error_msg)
+                    return ChatResult(ChatStatus.ERROR, error_msg, model=model, endpoint=endpoint.url)
+            finally:
+                response.close()
+                self.endpoint_pool.release(endpoint)
                 
+        except GenerationCancelledError:
+            return ChatResult(ChatStatus.CANCELLED, model=model, endpoint=endpoint.url if endpoint else None)
+            
+        except CircuitOpenError as e:
+            error_msg = "Ollamaサーバーが応答していないため、しばらくリクエストを停止しています。少し待ってから再試行してください。"
+            self.logger.warning(f"サーキットブレーカー: {str(e)}")
+            return ChatResult(ChatStatus.CIRCUIT_OPEN, error_msg, model=model)
+            
         except requests.exceptions.ConnectionError as e:
             error_msg = "Ollamaサーバーに接続できません。サーバーが起動しているか確認してください。"
             self.logger.error(f"接続エラー: {str(e)}")
-            return error_msg
+            return ChatResult(ChatStatus.CONNECTION_ERROR, error_msg, model=model)
             
-        except requests.exceptions.Timeout as e:
-            error_msg = f"リクエストがタイムアウトしました（{API_TIMEOUT}秒）。モデルが大きすぎるか、サーバーが過負荷の可能性があります。"
+        except (requests.exceptions.Timeout, OllamaTimeoutError) as e:
+            if deadline.expired():
+                error_msg = f"応答の生成が制限時間（{TURN_DEADLINE}秒）内に終わりませんでした。最大トークン数を減らすか、より小さなモデルを使用してください。"
+            else:
+                error_msg = f"リクエストがタイムアウトしました（{API_TIMEOUT}秒）。モデルが大きすぎるか、サーバーが過負荷の可能性があります。"
             self.logger.error(f"タイムアウトエラー: {str(e)}")
-            return error_msg
+            if endpoint is not None:
+                self.endpoint_pool.record_request_failure(endpoint)
+            return ChatResult(ChatStatus.TIMEOUT, error_msg, model=model, endpoint=endpoint.url if endpoint else None)
             
         except json.JSONDecodeError as e:
             error_msg = "サーバーからの応答を解析できませんでした。"
             self.logger.error(f"JSON解析エラー: {str(e)}")
-            return error_msg
+            return ChatResult(ChatStatus.INVALID_RESPONSE, error_msg, model=model)
+            
+        except OllamaAPIError as e:
+            error_msg = f"Ollamaサーバーでエラーが発生しました: {str(e)}"
+            self.logger.error(error_msg)
+            if endpoint is not None and self._is_model_error(str(e)):
+                return self._model_error_result(model, endpoint)
+            if endpoint is not None:
+                self.endpoint_pool.record_request_failure(endpoint)
+            return ChatResult(ChatStatus.SERVER_ERROR, error_msg, model=model, endpoint=endpoint.url if endpoint else None)
             
         except Exception as e:
             error_msg = f"予期しないエラーが発生しました: {str(e)}"
             self.logger.error(error_msg)
-            return error_msg 
\ No newline at end of file
+            return ChatResult(ChatStatus.ERROR, error_msg, model=model)
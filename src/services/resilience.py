@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+
+class Deadline:
+    """1ターンあたりの時間予算を管理するクラス"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.started_at = time.monotonic()
+
+    def elapsed(self) -> float:
+        """経過時間（秒）を返す"""
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        """残り時間（秒）を返す"""
+        return max(self.budget - self.elapsed(), 0.0)
+
+    def expired(self) -> bool:
+        """予算を使い切ったかどうか"""
+        return self.remaining() <= 0.0
+
+    def timeout(self, limit: float) -> float:
+        """リクエストに使うタイムアウトを残り時間で制限して返す"""
+        return max(min(limit, self.remaining()), 0.001)
+
+
+class CircuitBreaker:
+    """連続失敗時にリクエストを遮断し、一定時間後に試行を再開するサーキットブレーカー"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        # half_open で送信中の試行リクエストがあるかどうか
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """現在の状態（遮断時間を過ぎていれば half_open）を返す"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow_request(self) -> bool:
+        """リクエストを送れる見込みがあるかどうか（送信権は取得しない）"""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and not self._trial_in_flight)
+
+    def try_acquire(self) -> bool:
+        """リクエストの送信権を取得する（half_open では試行リクエスト1件だけに許可する）"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release_trial(self) -> None:
+        """成功・失敗を記録せずに終わった試行リクエスト（キャンセルなど）の送信権を返す"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_probe_success(self) -> None:
+        """ヘルスチェックの成功を記録する
+
+        ヘルスチェックは /api/chat の失敗（過負荷によるタイムアウトや5xx）を検知できないため、
+        遮断時間を過ぎた場合に試行を許可する half_open へ進めるだけで、遮断は解除しない。
+        """
+        with self._lock:
+            if self._current_state() == self.HALF_OPEN and self._state != self.HALF_OPEN:
+                self._state = self.HALF_OPEN
+                self.logger.info(f"サーキットブレーカーを半開にしました: {self.name}")
+
+    def record_success(self) -> None:
+        """成功を記録し、遮断を解除する"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                self.logger.info(f"サーキットブレーカーを閉じました: {self.name}")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """失敗を記録し、しきい値を超えたら（または試行中の失敗なら）遮断する"""
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.logger.warning(
+                        f"サーキットブレーカーを開きました: {self.name} "
+                        f"(連続失敗 {self._failures} 回, {self.reset_timeout}秒間遮断)"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
@@ -0,0 +1,119 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Tuple
+
+
+class SessionStore:
+    """会話履歴をサーバー側で保持するクラス
+
+    最近使われたセッションはメモリ上のLRUに保持し、すべてのターンはSQLiteに追記していく。
+    ブラウザとの間で履歴全体を往復させずに済み、アプリを再起動しても履歴が残る。
+    最後のターンから ttl 秒を過ぎたセッションは定期的に削除する。
+    """
+
+    CLEANUP_INTERVAL = 3600.0
+
+    def __init__(self, db_path: str, cache_size: int = 256, ttl: float = 86400.0):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._last_cleanup = 0.0
+        self._cache: "OrderedDict[str, List[Tuple[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS turns (
+                session_id TEXT NOT NULL,
+                turn_index INTEGER NOT NULL,
+                user_message TEXT NOT NULL,
+                assistant_message TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, turn_index)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_turns_created_at ON turns (created_at)")
+        self._conn.commit()
+        self.logger.info(f"セッションストアを初期化: {db_path} (キャッシュ {cache_size} セッション)")
+        self.cleanup_expired()
+
+    def _load(self, session_id: str) -> List[Tuple[str, str]]:
+        """キャッシュまたはSQLiteから履歴を取得する（ロック取得済みで呼ぶこと）"""
+        history = self._cache.get(session_id)
+        if history is not None:
+            self._cache.move_to_end(session_id)
+            return history
+
+        rows = self._conn.execute(
+            "SELECT user_message, assistant_message FROM turns WHERE session_id = ? ORDER BY turn_index",
+            (session_id,)
+        ).fetchall()
+        history = [(user, assistant) for user, assistant in rows]
+        if rows:
+            self.logger.debug(f"SQLiteからセッションを復元: {session_id} ({len(rows)} ターン)")
+
+        self._cache[session_id] = history
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return history
+
+    def get_history(self, session_id: str) -> List[Tuple[str, str]]:
+        """セッションの会話履歴のコピーを返す"""
+        with self._lock:
+            return list(self._load(session_id))
+
+    def append_turn(self, session_id: str, user_message: str, assistant_message: str) -> List[Tuple[str, str]]:
+        """ターンを追記し、更新後の会話履歴のコピーを返す"""
+        with self._lock:
+            history = self._load(session_id)
+            self._conn.execute(
+                "INSERT INTO turns (session_id, turn_index, user_message, assistant_message, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (session_id, len(history), user_message, assistant_message, time.time())
+            )
+            self._conn.commit()
+            history.append((user_message, assistant_message))
+            history_copy = list(history)
+
+        if time.time() - self._last_cleanup >= self.CLEANUP_INTERVAL:
+            self.cleanup_expired()
+        return history_copy
+
+    def cleanup_expired(self) -> int:
+        """最後のターンから ttl 秒を過ぎたセッションを削除し、削除したセッション数を返す"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created_at) < ?",
+                (cutoff,)
+            ).fetchall()]
+            if expired:
+                self._conn.executemany("DELETE FROM turns WHERE session_id = ?", [(sid,) for sid in expired])
+                self._conn.commit()
+                for session_id in expired:
+                    self._cache.pop(session_id, None)
+            self._last_cleanup = time.time()
+
+        if expired:
+            self.logger.info(f"期限切れのセッションを削除: {len(expired)} 件")
+        return len(expired)
+
+    def clear(self, session_id: str) -> None:
+        """セッションの会話履歴を削除する"""
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+            self._cache[session_id] = []
+            self._cache.move_to_end(session_id)
+        self.logger.debug(f"セッションをクリア: {session_id}")
+
+    def close(self) -> None:
+        """データベース接続を閉じる"""
+        with self._lock:
+            self._conn.close()
@@ -1,61 +1,246 @@
+import threading
+import logging
+import time
+import uuid
+from typing import Dict, Optional
 import gradio as gr
-from src.config.settings import MODEL_NAME, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS
+from src.config.settings import (
+    MODEL_NAME, DEFAULT_TEMPERATURE, DEFAULT_MAX_TOKENS, SESSION_DB_PATH, SESSION_CACHE_SIZE,
+    SESSION_TTL_HOURS, SESSION_HEARTBEAT_INTERVAL, SESSION_HEARTBEAT_TIMEOUT
+)
 from src.services.ollama_service import OllamaService
+from src.services.session_store import SessionStore
+from src.services.chat_result import ChatStatus
+from src.services.model_router import AUTO_MODEL
 from src.utils.audio_utils import AudioUtils
 
+# ページ読み込み時に一度だけ、非表示のハートビートボタンを定期的に押すタイマーを登録する
+HEARTBEAT_JS = """
+() => {
+    if (!window.speakL2Heartbeat) {
+        window.speakL2Heartbeat = setInterval(() => {
+            const button = document.getElementById("session-heartbeat");
+            if (button) button.click();
+        }, %d);
+    }
+}
+""" % int(SESSION_HEARTBEAT_INTERVAL * 1000)
+
+# タブを閉じる・別ページへ移動するときに、実行中のターンのキャンセルを送る
+# （sendBeacon はページ破棄後も送信が完了する。届かなかった場合はハートビートの途絶で回収する）
+PAGEHIDE_JS = """
+(sessionId) => {
+    window.speakL2SessionId = sessionId;
+    if (!window.speakL2Pagehide) {
+        window.speakL2Pagehide = true;
+        window.addEventListener("pagehide", () => {
+            if (!window.speakL2SessionId) return;
+            const body = JSON.stringify({ data: [window.speakL2SessionId] });
+            navigator.sendBeacon(
+                new URL("run/cancel_turn", window.location.href),
+                new Blob([body], { type: "application/json" })
+            );
+        });
+    }
+}
+"""
+
 class ChatInterface:
     """チャットインターフェースを構築するクラス"""
     
     def __init__(self):
         self.ollama_service = OllamaService()
         self.audio_utils = AudioUtils()
+        # 会話履歴はサーバー側で保持し、ブラウザから毎回受け取らない
+        self.session_store = SessionStore(
+            SESSION_DB_PATH, cache_size=SESSION_CACHE_SIZE, ttl=SESSION_TTL_HOURS * 3600
+        )
         self.teacher_mode = True  # デフォルトで教師モードをオン
+        self.logger = logging.getLogger(__name__)
+        
+        # セッションごとの実行中ターンのキャンセルイベント
+        self._turn_events: Dict[str, threading.Event] = {}
+        # セッションごとの最終ハートビート時刻（一度でも届いたセッションのみ）
+        self._last_seen: Dict[str, float] = {}
+        self._turn_lock = threading.Lock()
+        
+        # Gradio 3.50 にはタブを閉じたことを通知するイベントがないため、pagehide での通知に加えて
+        # ハートビートが途絶えたセッションの実行中ターンを定期的にキャンセルする
+        self._reaper_thread = threading.Thread(
+            target=self._reap_abandoned_turns_loop, name="session-heartbeat-reaper", daemon=True
+        )
+        self._reaper_thread.start()
+    
+    @staticmethod
+    def new_session_id() -> str:
+        """ブラウザのタブごとに一意なセッションIDを発行する"""
+        return uuid.uuid4().hex
+    
+    @staticmethod
+    def _require_session(session_id: Optional[str]) -> str:
+        """セッションIDを検証する（共有キーへのフォールバックで他の利用者と履歴が混ざるのを防ぐ）"""
+        if not session_id:
+            raise gr.Error("セッションが初期化されていません。ページを再読み込みしてください。")
+        return session_id
+    
+    def _start_turn(self, session_id: str) -> threading.Event:
+        """新しいターンを開始し、同じセッションで実行中のターンをキャンセルする"""
+        event = threading.Event()
+        with self._turn_lock:
+            previous = self._turn_events.get(session_id)
+            self._turn_events[session_id] = event
+            # 入力が届いたタブは開いているので、直前のハートビートの遅れでキャンセルしない
+            if session_id in self._last_seen:
+                self._last_seen[session_id] = time.monotonic()
+        if previous is not None:
+            previous.set()
+            self.logger.info(f"新しい入力により前のターンをキャンセル: {session_id}")
+        return event
+    
+    def _finish_turn(self, session_id: str, event: threading.Event) -> None:
+        """ターンの終了を記録する"""
+        with self._turn_lock:
+            if self._turn_events.get(session_id) is event:
+                del self._turn_events[session_id]
+    
+    def cancel_turn(self, session_id: str) -> None:
+        """セッションで実行中のターンをキャンセルする"""
+        with self._turn_lock:
+            event = self._turn_events.pop(session_id, None)
+        if event is not None:
+            event.set()
+            self.logger.info(f"実行中のターンをキャンセル: {session_id}")
+    
+    def heartbeat(self, session_id: str) -> None:
+        """ブラウザのタブが開いていることを記録する"""
+        if session_id:
+            with self._turn_lock:
+                self._last_seen[session_id] = time.monotonic()
+    
+    def reap_abandoned_turns(self) -> int:
+        """ハートビートが途絶えたセッションの実行中ターンをキャンセルし、キャンセルした数を返す
+        
+        ハートビートが一度も届いていないセッションは対象外とする（スクリプトが動かない環境で
+        長いターンを誤ってキャンセルしないため）。
+        """
+        cutoff = time.monotonic() - SESSION_HEARTBEAT_TIMEOUT
+        with self._turn_lock:
+            stale = [sid for sid, seen in self._last_seen.items() if seen < cutoff]
+            abandoned = []
+            for session_id in stale:
+                del self._last_seen[session_id]
+                event = self._turn_events.pop(session_id, None)
+                if event is not None:
+                    abandoned.append((session_id, event))
+        
+        for session_id, event in abandoned:
+            event.set()
+            self.logger.info(f"タブが閉じられたため実行中のターンをキャンセル: {session_id}")
+        return len(abandoned)
+    
+    def _reap_abandoned_turns_loop(self) -> None:
+        while True:
+            time.sleep(SESSION_HEARTBEAT_INTERVAL)
+            try:
+                self.reap_abandoned_turns()
+            except Exception as e:
+                self.logger.error(f"ハートビートの確認中にエラー: {str(e)}")
+    
+    def clear_chat(self, session_id):
+        """実行中の生成をキャンセルして会話をクリアする"""
+        if session_id:
+            self.cancel_turn(session_id)
+            self.session_store.clear(session_id)
+        return []
+    
+    def _finish_response(self, session_id: str, user_message: str, result, history):
+        """応答結果から表示する履歴を作る（成功したターンのみ保存し、エラーは表示するだけにする）"""
+        if result.ok:
+            return self.session_store.append_turn(session_id, user_message, result.content)
+        return history + [(user_message, result.content)]
         
-    def chat(self, message, history, temperature, max_tokens, model, teacher_mode, language, speech_speed):
+    def chat(self, session_id, message, temperature, max_tokens, model, teacher_mode, language, speech_speed):
         """テキスト入力によるチャット処理"""
+        session_id = self._require_session(session_id)
         # 言語選択の値を言語コードに変換
         lang_code = "ja" if language == "日本語" else "en"
+        cancel_event = self._start_turn(session_id)
+        history = self.session_store.get_history(session_id)
         
-        # Ollamaからの応答を取得
-        response = self.ollama_service.get_chat_response(
-            message, history, model, temperature, max_tokens, is_teacher_mode=teacher_mode, language=lang_code
-        )
+        try:
+            # Ollamaからの応答を取得
+            result = self.ollama_service.get_chat_response(
+                message, history, model, temperature, max_tokens, is_teacher_mode=teacher_mode, language=lang_code,
+                cancel_event=cancel_event
+            )
+            
+            # 音声ファイルの生成（エラーメッセージは読み上げない）
+            audio_file = None
+            if result.ok:
+                audio_file = self.audio_utils.text_to_speech(
+                    result.content, language=lang_code, speed=speech_speed, cancel_event=cancel_event
+                )
+        finally:
+            self._finish_turn(session_id, cancel_event)
         
-        # 音声ファイルの生成
-        audio_file = self.audio_utils.text_to_speech(response, language=lang_code, speed=speech_speed)
+        # キャンセルされたターンは画面を更新しない（クリア後に履歴が戻らないようにする）
+        if result.status == ChatStatus.CANCELLED or cancel_event.is_set():
+            return gr.update(), gr.update()
         
         # 履歴を更新して返す
-        history.append((message, response))
-        return history, history, audio_file
+        return self._finish_response(session_id, message, result, history), audio_file
     
-    def voice_chat(self, audio_file, history, temperature, max_tokens, model, teacher_mode, language, speech_speed):
+    def voice_chat(self, session_id, audio_file, temperature, max_tokens, model, teacher_mode, language, speech_speed):
         """音声入力によるチャット処理"""
         if audio_file is None:
-            return history, history, None
+            return gr.update(), None
         
+        session_id = self._require_session(session_id)
         # 言語選択の値を言語コードに変換
         lang_code = "ja" if language == "日本語" else "en"
+        cancel_event = self._start_turn(session_id)
+        history = self.session_store.get_history(session_id)
         
-        # 音声をテキストに変換
-        text = self.audio_utils.transcribe_audio(audio_file, language=lang_code)
-        
-        # テキストから応答を生成
-        response = self.ollama_service.get_chat_response(
-            text, history, model, temperature, max_tokens, is_teacher_mode=teacher_mode, language=lang_code
-        )
+        try:
+            # 音声をテキストに変換
+            text = self.audio_utils.transcribe_audio(audio_file, language=lang_code, session_id=session_id)
+            
+            # テキストから応答を生成
+            result = self.ollama_service.get_chat_response(
+                text, history, model, temperature, max_tokens, is_teacher_mode=teacher_mode, language=lang_code,
+                cancel_event=cancel_event
+            )
+            
+            # 応答を音声に変換（エラーメッセージは読み上げない）
+            audio_response = None
+            if result.ok:
+                audio_response = self.audio_utils.text_to_speech(
+                    result.content, language=lang_code, speed=speech_speed, cancel_event=cancel_event
+                )
+        finally:
+            self._finish_turn(session_id, cancel_event)
         
-        # 応答を音声に変換
-        audio_response = self.audio_utils.text_to_speech(response, language=lang_code, speed=speech_speed)
+        if result.status == ChatStatus.CANCELLED or cancel_event.is_set():
+            return gr.update(), gr.update()
         
         # 履歴を更新
-        history.append((text, response))
-        return history, history, audio_response
+        return self._finish_response(session_id, text, result, history), audio_response
     
     def build_interface(self):
         """Gradioインターフェースの構築"""
-        with gr.Blocks(title="Speak L2 with LLM") as ui:
+        with gr.Blocks(
+            title="Speak L2 with LLM", css="#session-heartbeat, #session-cancel { display: none; }"
+        ) as ui:
             gr.Markdown("# Speak L2 with LLM")
             gr.Markdown("言語練習のためのAIアシスタントです。文法や表現の間違いを指摘し、自然な会話練習をサポートします。")
+            
+            # タブごとのセッションID。gr.State はサーバーのメモリ上にあり再起動で失われるため、
+            # 非表示のテキストボックスとしてブラウザ側に保持し、各イベントで送信する
+            session_id = gr.Textbox(visible=False)
+            # タブが開いている間 HEARTBEAT_JS が定期的に押す（CSSで非表示）
+            heartbeat_btn = gr.Button("heartbeat", elem_id="session-heartbeat")
+            # PAGEHIDE_JS が /run/cancel_turn として呼び出すためのイベント（CSSで非表示）
+            cancel_btn = gr.Button("cancel", elem_id="session-cancel")
 
             with gr.Row():
                 with gr.Column(scale=3):
@@ -101,9 +286,10 @@ class ChatInterface:
                         default_model = MODEL_NAME
                     
                     model_dropdown = gr.Dropdown(
-                        choices=available_models if available_models else [MODEL_NAME],
+                        choices=[AUTO_MODEL] + (available_models if available_models else [MODEL_NAME]),
                         value=default_model,
-                        label="モデル選択"
+                        label="モデル選択",
+                        info="auto を選ぶと、発話の長さやサーバーの混雑状況に応じてモデルを自動で切り替えます。"
                     )
                     
                     temperature = gr.Slider(
@@ -133,23 +319,33 @@ class ChatInterface:
             # イベントハンドラの設定
             text_input.submit(
                 self.chat, 
-                [text_input, chatbot, temperature, max_tokens, model_dropdown, teacher_mode_checkbox, language_dropdown, speech_speed], 
-                [chatbot, chatbot, audio_output]
+                [session_id, text_input, temperature, max_tokens, model_dropdown, teacher_mode_checkbox, language_dropdown, speech_speed], 
+                [chatbot, audio_output]
             ).then(lambda: "", None, [text_input])
             
             submit_btn.click(
                 self.chat, 
-                [text_input, chatbot, temperature, max_tokens, model_dropdown, teacher_mode_checkbox, language_dropdown, speech_speed], 
-                [chatbot, chatbot, audio_output]
+                [session_id, text_input, temperature, max_tokens, model_dropdown, teacher_mode_checkbox, language_dropdown, speech_speed], 
+                [chatbot, audio_output]
             ).then(lambda: "", None, [text_input])
             
             audio_input.change(
                 self.voice_chat, 
-                [audio_input, chatbot, temperature, max_tokens, model_dropdown, teacher_mode_checkbox, language_dropdown, speech_speed], 
-                [chatbot, chatbot, audio_output]
+                [session_id, audio_input, temperature, max_tokens, model_dropdown, teacher_mode_checkbox, language_dropdown, speech_speed], 
+                [chatbot, audio_output]
+            )
+            
+            clear_btn.click(self.clear_chat, [session_id], [chatbot])
+            
+            # ページ読み込み時にセッションIDを発行し、タブを閉じたときのキャンセル通知を登録
+            ui.load(self.new_session_id, None, [session_id]).then(
+                None, [session_id], None, _js=PAGEHIDE_JS
             )
+            cancel_btn.click(self.cancel_turn, [session_id], None, api_name="cancel_turn")
             
-            clear_btn.click(lambda: [], None, [chatbot])
+            # 通知が届かなかった場合も実行中の生成をキャンセルするためのハートビート
+            heartbeat_btn.click(self.heartbeat, [session_id], None)
+            ui.load(None, None, None, _js=HEARTBEAT_JS)
             
             # フッター
             gr.Markdown("---")
@@ -0,0 +1,196 @@
+import logging
+import multiprocessing
+import threading
+import time
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def _init_worker() -> None:
+    """ワーカープロセスの初期化（pydubとffmpegのパス解決を事前に済ませる）"""
+    from pydub import AudioSegment
+    AudioSegment.silent(duration=10)
+
+
+def _warmup() -> bool:
+    """ワーカープロセスを起動させるための空タスク"""
+    return True
+
+
+def _timed_call(func: Callable, *args) -> Tuple[Any, float]:
+    """ワーカー内で関数を実行し、結果と実行時間を返す"""
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+def convert_audio_file(source_path: str, target_path: str, target_format: str = "wav") -> str:
+    """音声ファイルを音声認識に適した形式に変換する（ワーカープロセスで実行）"""
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(source_path)
+
+    # WAVに変換して保存（16bitに設定）
+    if target_format.lower() == "wav":
+        audio = audio.set_sample_width(2)  # 16-bit
+        audio = audio.set_frame_rate(16000)  # 音声認識に適した16kHz
+        audio = audio.set_channels(1)  # モノラル
+
+    audio.export(target_path, format=target_format)
+    return target_path
+
+
+def change_speed_and_export(source_path: str, target_path: str, speed: float) -> Optional[str]:
+    """mp3を読み込み、再生速度を調整してmp3で書き出す（ワーカープロセスで実行）
+
+    速度調整に失敗した場合は元の速度のまま書き出し、失敗理由を返す（成功時はNone）。
+    """
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_mp3(source_path)
+
+    speed_error = None
+    if speed != 1.0:
+        try:
+            audio = audio._spawn(audio.raw_data, overrides={
+                "frame_rate": int(audio.frame_rate * speed)
+            })
+        except Exception as e:
+            speed_error = str(e)
+
+    audio.export(target_path, format="mp3")
+    return speed_error
+
+
+class AudioExecutor:
+    """CPU負荷の高い音声処理を専用のプロセスプールで実行するクラス
+
+    Gradioのリクエストスレッドでpydubやffmpegを直接実行すると、GILとCPUを奪い合って
+    テキストのみの利用者の応答まで遅くなるため、処理を別プロセスに逃がす。
+
+    spawn で起動したワーカーは起動スクリプトを __mp_main__ として読み込み直すため、
+    起動スクリプトのトップレベルでは Gradio やUIを import しないこと（main.py 参照）。
+    このモジュールは標準ライブラリのみに依存し、pydub はワーカー内で初めて読み込む。
+    """
+
+    def __init__(self, max_workers: int = 2, name: str = "audio", stats_interval: float = 60.0):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.max_workers = max_workers
+        # 運用者がキュー詰まりに気づけるよう、この間隔で統計をINFOログに出す（0で無効）
+        self.stats_interval = stats_interval
+        self._executor = self._create_executor()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._total_exec_time = 0.0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._max_queue_depth = 0
+        self._last_stats_log = time.monotonic()
+        atexit.register(self.shutdown)
+
+        self.logger.info(f"音声処理ワーカーを起動: {name} {max_workers} プロセス")
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        """プロセスプールを作成し、ワーカーを事前に起動しておく"""
+        # 起動済みのスレッド（ヘルスチェック等）を引き継がないよう spawn で起動する
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        for _ in range(self.max_workers):
+            executor.submit(_warmup)
+        return executor
+
+    def _rebuild_executor(self, broken: ProcessPoolExecutor) -> None:
+        """ワーカーの異常終了で使えなくなったプロセスプールを作り直す
+
+        ProcessPoolExecutor はワーカーが1つでも異常終了すると以後すべての投入を拒否するため。
+        複数のスレッドが同時に検知した場合は最初の1回だけ作り直す。
+        """
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._create_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.logger.warning(f"音声処理ワーカーが異常終了したため、プロセスプールを再作成しました: {self.name}")
+
+    def _submit(self, func: Callable, *args) -> Tuple[Any, float]:
+        """ワーカーで実行し、プロセスプールが壊れていた場合は作り直して1回だけ再試行する"""
+        executor = self._executor
+        try:
+            return executor.submit(_timed_call, func, *args).result()
+        except BrokenProcessPool:
+            self._rebuild_executor(executor)
+        return self._executor.submit(_timed_call, func, *args).result()
+
+    def run(self, func: Callable, *args) -> Any:
+        """ワーカープロセスで関数を実行し、完了まで待って結果を返す"""
+        with self._lock:
+            self._pending += 1
+            queue_depth = max(self._pending - self.max_workers, 0)
+            self._max_queue_depth = max(self._max_queue_depth, queue_depth)
+
+        submitted_at = time.perf_counter()
+        try:
+            result, exec_time = self._submit(func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        total_time = time.perf_counter() - submitted_at
+        wait_time = max(total_time - exec_time, 0.0)
+        with self._lock:
+            self._completed += 1
+            self._total_exec_time += exec_time
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+
+        self.logger.debug(
+            f"音声処理完了: {self.name}/{func.__name__} 実行 {exec_time:.3f}秒, 待機 {wait_time:.3f}秒, "
+            f"投入時のキュー深さ {queue_depth}"
+        )
+        self._maybe_log_stats()
+        return result
+
+    def _maybe_log_stats(self) -> None:
+        """前回の出力から stats_interval を過ぎていれば統計をINFOログに出す"""
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_stats_log < self.stats_interval:
+                return
+            self._last_stats_log = now
+            max_queue_depth, self._max_queue_depth = self._max_queue_depth, 0
+            max_wait_time, self._max_wait_time = self._max_wait_time, 0.0
+
+        stats = self.stats()
+        self.logger.info(
+            f"音声処理ワーカー統計: {self.name} 完了 {stats['completed']} 件, "
+            f"平均実行 {stats['avg_exec_time']:.3f}秒, 平均待機 {stats['avg_wait_time']:.3f}秒, "
+            f"直近の最大待機 {max_wait_time:.3f}秒, 直近の最大キュー深さ {max_queue_depth}, "
+            f"現在の処理中 {stats['pending']}"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        """キュー深さと実行時間の統計を返す"""
+        with self._lock:
+            completed = self._completed
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "pending": self._pending,
+                "queue_depth": max(self._pending - self.max_workers, 0),
+                "completed": completed,
+                "avg_exec_time": self._total_exec_time / completed if completed else 0.0,
+                "avg_wait_time": self._total_wait_time / completed if completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """プロセスプールを停止する"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,14 +1,17 @@
 import tempfile
 import speech_recognition as sr
 from gtts import gTTS
-from pydub import AudioSegment
 from pydub.playback import play
 import numpy as np
 import os
 import logging
 import atexit
+import threading
 from typing import Optional, List
 from contextlib import contextmanager
+from src.config.settings import AUDIO_WORKERS, AUDIO_TTS_WORKERS, AUDIO_STATS_INTERVAL
+from src.utils.audio_executor import AudioExecutor, convert_audio_file, change_speed_and_export
+from src.utils.noise_profile import NoiseProfileCache
 
 class AudioProcessingError(Exception):
     """音声処理関連のエラー"""
@@ -72,9 +75,19 @@ class AudioUtils:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.temp_manager = TempFileManager()
+        # pydub/ffmpegによるCPU負荷の高い処理はプロセスプールで実行する。
+        # テキスト入力の音声合成が音声入力の変換待ちに並ばないよう、プールを分ける
+        self.input_executor = AudioExecutor(
+            max_workers=AUDIO_WORKERS, name="input", stats_interval=AUDIO_STATS_INTERVAL
+        )
+        self.tts_executor = AudioExecutor(
+            max_workers=AUDIO_TTS_WORKERS, name="tts", stats_interval=AUDIO_STATS_INTERVAL
+        )
+        # ノイズレベルはセッションごとに保持し、認識前に前後の無音を取り除くのに使う
+        self.noise_profiles = NoiseProfileCache()
     
-    def transcribe_audio(self, audio_file: str, language: str = "ja") -> str:
-        """音声ファイルをテキストに変換する"""
+    def transcribe_audio(self, audio_file: str, language: str = "ja", session_id: Optional[str] = None) -> str:
+        """音声ファイルをテキストに変換する（session_id を指定した場合はセッションのノイズレベルで前後の無音を取り除く）"""
         if not audio_file or not os.path.exists(audio_file):
             raise AudioRecognitionError("音声ファイルが存在しません")
         
@@ -86,16 +99,23 @@ class AudioUtils:
             file_to_use = converted_file if converted_file else audio_file
             
             recognizer = sr.Recognizer()
-            # 認識精度を向上させるための調整
-            recognizer.energy_threshold = 300
-            recognizer.dynamic_energy_threshold = True
-            recognizer.pause_threshold = 0.8
             
             with sr.AudioFile(file_to_use) as source:
-                # 環境ノイズを調整
-                recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                # 冒頭を環境ノイズの計測に使わず、録音全体を認識対象にする
                 audio_data = recognizer.record(source)
                 
+                # セッションのノイズレベルを更新し、前後の無音を取り除いて送信量を減らす
+                if session_id:
+                    energies = self.noise_profiles.frame_energies(audio_data)
+                    threshold = self.noise_profiles.update(session_id, energies)
+                    trimmed = self.noise_profiles.trim_silence(audio_data, energies, threshold)
+                    if trimmed is not audio_data:
+                        self.logger.debug(
+                            f"前後の無音を除去: {len(audio_data.frame_data)} -> {len(trimmed.frame_data)} バイト "
+                            f"(しきい値 {threshold:.1f})"
+                        )
+                    audio_data = trimmed
+                
                 # 言語コードを設定
                 lang_code = "ja-JP" if language == "ja" else "en-US"
                 
@@ -133,8 +153,13 @@ class AudioUtils:
                 except OSError as e:
                     self.logger.warning(f"音声変換ファイルの削除に失敗: {converted_file} - {str(e)}")
     
-    def text_to_speech(self, text: str, language: str = "ja", speed: float = 1.25) -> Optional[str]:
-        """テキストを音声ファイルに変換する"""
+    def text_to_speech(self, text: str, language: str = "ja", speed: float = 1.25,
+                       cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        """テキストを音声ファイルに変換する（cancel_event がセットされた場合は途中で破棄する）"""
+        if cancel_event is not None and cancel_event.is_set():
+            self.logger.debug("キャンセル済みのため音声合成をスキップ")
+            return None
+        
         if not text or not text.strip():
             self.logger.warning("空のテキストが音声合成に渡されました")
             return None
@@ -167,36 +192,29 @@ class AudioUtils:
                         self.logger.error(f"音声合成エラー: {str(e)}")
                         return None
                 
-                # 音声ファイルを読み込み
-                try:
-                    audio = AudioSegment.from_mp3(initial_temp_file)
-                    self.logger.debug(f"音声ファイル読み込み完了: 長さ={len(audio)}ms")
-                except Exception as e:
-                    self.logger.error(f"音声ファイルの読み込みに失敗: {str(e)}")
+                if cancel_event is not None and cancel_event.is_set():
+                    self.logger.debug("音声合成がキャンセルされました")
                     return None
                 
-                # 再生速度を調整
-                if speed != 1.0:
-                    try:
-                        audio = audio._spawn(audio.raw_data, overrides={
-                            "frame_rate": int(audio.frame_rate * speed)
-                        })
-                        self.logger.debug(f"再生速度を{speed}倍に調整")
-                    except Exception as e:
-                        self.logger.warning(f"速度調整に失敗、元の速度を使用: {str(e)}")
-                
                 # 最終的な音声ファイルを作成（Gradio用に管理対象外で作成）
+                final_temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
+                final_temp_file.close()
+                
                 try:
-                    final_temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-                    final_temp_file.close()
-                    
-                    audio.export(final_temp_file.name, format="mp3")
-                    self.logger.info(f"音声合成完了: {final_temp_file.name}")
+                    # 読み込み・速度調整・書き出しをワーカープロセスで実行
+                    speed_error = self.tts_executor.run(
+                        change_speed_and_export, initial_temp_file, final_temp_file.name, speed
+                    )
+                    if speed_error:
+                        self.logger.warning(f"速度調整に失敗、元の速度を使用: {speed_error}")
+                        speed = 1.0
+                    self.logger.info(f"音声合成完了: {final_temp_file.name} (速度: {speed}倍)")
                     
                     # このファイルはGradioが管理するので、一時ファイル管理対象に含めない
                     return final_temp_file.name
                     
                 except Exception as e:
+                    self.temp_manager.remove_temp_file(final_temp_file.name)
                     self.logger.error(f"最終音声ファイルの作成に失敗: {str(e)}")
                     return None
                         
@@ -218,19 +236,8 @@ class AudioUtils:
             temp_file.close()
             
             try:
-                # AudioSegmentを使用して変換
-                audio = AudioSegment.from_file(audio_file)
-                
-                # 音声の基本情報をログ出力
-                self.logger.debug(f"元音声情報: 長さ={len(audio)}ms, チャンネル={audio.channels}, サンプルレート={audio.frame_rate}Hz")
-                
-                # WAVに変換して保存（16bitに設定）
-                if target_format.lower() == "wav":
-                    audio = audio.set_sample_width(2)  # 16-bit
-                    audio = audio.set_frame_rate(16000)  # 音声認識に適した16kHz
-                    audio = audio.set_channels(1)  # モノラル
-                
-                audio.export(temp_file.name, format=target_format)
+                # デコード・リサンプリング・書き出しをワーカープロセスで実行
+                self.input_executor.run(convert_audio_file, audio_file, temp_file.name, target_format)
                 self.logger.debug(f"音声形式変換完了: {temp_file.name}")
                 
                 # 呼び出し元で削除する必要があるファイルとして返す
@@ -0,0 +1,94 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+import speech_recognition as sr
+
+
+class NoiseProfileCache:
+    """セッションごとの環境ノイズレベルを保持し、録音の前後の無音を取り除くクラス
+
+    録音全体を短いフレームに分け、初回は下位パーセンタイルのエネルギーをノイズレベルとし、
+    以降はしきい値未満（無音と判定された）フレームのエネルギーで指数移動平均をとって更新する。
+    sr.Recognizer の energy_threshold は listen() でしか使われず record() と recognize_google() には
+    影響しないため、しきい値は認識前に先頭と末尾の無音を切り詰めて送信量を減らすのに使う。
+    """
+
+    FRAME_MS = 50
+    CALIBRATION_PERCENTILE = 10
+    THRESHOLD_RATIO = 1.5  # sr.Recognizer.dynamic_energy_ratio と同じ比率
+    SMOOTHING = 0.3
+    TRIM_MARGIN_MS = 300  # 語頭・語尾の弱い子音を削らないよう発話の前後に残す長さ
+
+    def __init__(self, max_sessions: int = 1024):
+        self.logger = logging.getLogger(__name__)
+        self.max_sessions = max_sessions
+        self._noise_floors: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def frame_energies(self, audio_data: sr.AudioData) -> np.ndarray:
+        """16bit PCMに変換した音声をフレームに分け、各フレームのRMSを返す"""
+        samples = np.frombuffer(audio_data.get_raw_data(convert_width=2), dtype=np.int16).astype(np.float64)
+        frame_size = self._frame_size(audio_data.sample_rate)
+        frame_count = len(samples) // frame_size
+        if frame_count == 0:
+            return np.sqrt(np.mean(samples ** 2, keepdims=True)) if len(samples) else np.zeros(0)
+        frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size)
+        return np.sqrt(np.mean(frames ** 2, axis=1))
+
+    def _frame_size(self, sample_rate: int) -> int:
+        """1フレームあたりのサンプル数"""
+        return max(int(sample_rate * self.FRAME_MS / 1000), 1)
+
+    def get_threshold(self, session_id: str) -> Optional[float]:
+        """セッションのエネルギーしきい値を返す（未計測の場合はNone）"""
+        with self._lock:
+            floor = self._noise_floors.get(session_id)
+            if floor is None:
+                return None
+            self._noise_floors.move_to_end(session_id)
+            return floor * self.THRESHOLD_RATIO
+
+    def update(self, session_id: str, energies: np.ndarray) -> float:
+        """フレームエネルギーからノイズレベルを計測・更新し、このクリップに適用するしきい値を返す"""
+        if len(energies) == 0:
+            return self.get_threshold(session_id) or 0.0
+
+        with self._lock:
+            floor = self._noise_floors.get(session_id)
+            if floor is None:
+                floor = float(np.percentile(energies, self.CALIBRATION_PERCENTILE))
+                self.logger.debug(f"ノイズレベルを初回計測: {session_id} = {floor:.1f}")
+            else:
+                silent = energies[energies < floor * self.THRESHOLD_RATIO]
+                if len(silent):
+                    floor = (1 - self.SMOOTHING) * floor + self.SMOOTHING * float(np.mean(silent))
+
+            self._noise_floors[session_id] = floor
+            self._noise_floors.move_to_end(session_id)
+            if len(self._noise_floors) > self.max_sessions:
+                self._noise_floors.popitem(last=False)
+
+        return floor * self.THRESHOLD_RATIO
+
+    def trim_silence(self, audio_data: sr.AudioData, energies: np.ndarray, threshold: float) -> sr.AudioData:
+        """しきい値を超えるフレームの前後に余白を残して、先頭と末尾の無音を取り除く
+
+        発話と判定できるフレームがない場合は、誤って全体を捨てないよう元の音声をそのまま返す。
+        """
+        voiced = np.flatnonzero(energies > threshold)
+        if len(voiced) == 0:
+            return audio_data
+
+        margin = self.TRIM_MARGIN_MS // self.FRAME_MS
+        start_frame = max(int(voiced[0]) - margin, 0)
+        end_frame = min(int(voiced[-1]) + 1 + margin, len(energies))
+        if start_frame == 0 and end_frame == len(energies):
+            return audio_data
+
+        raw = audio_data.get_raw_data(convert_width=2)
+        frame_bytes = self._frame_size(audio_data.sample_rate) * 2
+        end = len(raw) if end_frame == len(energies) else end_frame * frame_bytes
+        return sr.AudioData(raw[start_frame * frame_bytes:end], audio_data.sample_rate, 2)